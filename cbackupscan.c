@@ -0,0 +1,238 @@
+/* POSIX only (Linux, macOS); setup.py skips it on Windows, where fast_stat falls back to os.scandir */
+#define _GNU_SOURCE
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <dirent.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#ifdef __linux__
+#include <sys/sysmacros.h>
+#endif
+
+/* Subdirectories found in one directory, collected without holding the GIL */
+typedef struct {
+    char *names;
+    size_t names_len;
+    size_t names_cap;
+    size_t *offsets;
+    unsigned long long *devs;
+    long long *mtimes;
+    size_t count;
+    size_t cap;
+} subdir_list;
+
+static int subdir_list_append(subdir_list *list, const char *name, unsigned long long dev, long long mtime_ns)
+{
+    size_t len = strlen(name) + 1;
+
+    if (list->count == list->cap) {
+        size_t cap = list->cap ? list->cap * 2 : 16;
+        size_t *offsets = realloc(list->offsets, cap * sizeof(size_t));
+        if (offsets == NULL)
+            return -1;
+        list->offsets = offsets;
+        unsigned long long *devs = realloc(list->devs, cap * sizeof(unsigned long long));
+        if (devs == NULL)
+            return -1;
+        list->devs = devs;
+        long long *mtimes = realloc(list->mtimes, cap * sizeof(long long));
+        if (mtimes == NULL)
+            return -1;
+        list->mtimes = mtimes;
+        list->cap = cap;
+    }
+
+    if (list->names_len + len > list->names_cap) {
+        size_t cap = list->names_cap ? list->names_cap : 256;
+        while (list->names_len + len > cap)
+            cap *= 2;
+        char *names = realloc(list->names, cap);
+        if (names == NULL)
+            return -1;
+        list->names = names;
+        list->names_cap = cap;
+    }
+
+    memcpy(list->names + list->names_len, name, len);
+    list->offsets[list->count] = list->names_len;
+    list->devs[list->count] = dev;
+    list->mtimes[list->count] = mtime_ns;
+    list->names_len += len;
+    list->count++;
+    return 0;
+}
+
+static void subdir_list_free(subdir_list *list)
+{
+    free(list->names);
+    free(list->offsets);
+    free(list->devs);
+    free(list->mtimes);
+}
+
+/* lstat-like lookup of a directory entry; with use_statx only the needed statx fields are requested,
+   without syncing attributes from a network filesystem server */
+static int stat_entry(int dir_fd, const char *name, int use_statx, mode_t *mode, unsigned long long *size,
+                      unsigned long long *dev, long long *mtime_ns)
+{
+#ifdef STATX_SIZE
+    /* No "statx unavailable" flag: scan threads call this concurrently, and an ENOSYS failure is cheap */
+    if (use_statx) {
+        struct statx stx;
+        if (statx(dir_fd, name, AT_SYMLINK_NOFOLLOW | AT_STATX_DONT_SYNC,
+                  STATX_TYPE | STATX_SIZE | STATX_MTIME, &stx) == 0) {
+            *mode = stx.stx_mode;
+            *size = stx.stx_size;
+            *dev = makedev(stx.stx_dev_major, stx.stx_dev_minor);
+            *mtime_ns = (long long)stx.stx_mtime.tv_sec * 1000000000LL + stx.stx_mtime.tv_nsec;
+            return 0;
+        }
+        if (errno != ENOSYS)
+            return -1;
+    }
+#endif
+
+    struct stat st;
+    if (fstatat(dir_fd, name, &st, AT_SYMLINK_NOFOLLOW) != 0)
+        return -1;
+    *mode = st.st_mode;
+    *size = st.st_size;
+    *dev = st.st_dev;
+#ifdef __APPLE__
+    *mtime_ns = (long long)st.st_mtimespec.tv_sec * 1000000000LL + st.st_mtimespec.tv_nsec;
+#else
+    *mtime_ns = (long long)st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec;
+#endif
+    return 0;
+}
+
+static PyObject *scan_dir(PyObject *self, PyObject *args)
+{
+    PyObject *path_obj;
+    PyObject *path_bytes;
+    int with_stamps;
+    int use_statx = 0;
+
+    if (!PyArg_ParseTuple(args, "Op|p", &path_obj, &with_stamps, &use_statx))
+        return NULL;
+    if (!PyUnicode_FSConverter(path_obj, &path_bytes))
+        return NULL;
+
+    const char *path = PyBytes_AS_STRING(path_bytes);
+    unsigned long long total_size = 0;
+    unsigned long long file_count = 0;
+    subdir_list subdirs = {0};
+    int error = 0;
+    int no_memory = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    DIR *dir = opendir(path);
+    if (dir == NULL) {
+        error = errno;
+    } else {
+        int dir_fd = dirfd(dir);
+        struct dirent *entry;
+
+        for (;;) {
+            errno = 0;
+            entry = readdir(dir);
+            if (entry == NULL) {
+                error = errno;
+                break;
+            }
+
+            const char *name = entry->d_name;
+            if (name[0] == '.' && (name[1] == '\0' || (name[1] == '.' && name[2] == '\0')))
+                continue;
+
+            unsigned char type = entry->d_type;
+            if (type != DT_REG && type != DT_DIR && type != DT_UNKNOWN)
+                continue;
+            if (type == DT_DIR && !with_stamps) {
+                if (subdir_list_append(&subdirs, name, 0, 0) != 0) {
+                    no_memory = 1;
+                    break;
+                }
+                continue;
+            }
+
+            mode_t mode;
+            unsigned long long size;
+            unsigned long long dev;
+            long long mtime_ns;
+            if (stat_entry(dir_fd, name, use_statx, &mode, &size, &dev, &mtime_ns) != 0) {
+                error = errno;
+                break;
+            }
+
+            if (S_ISDIR(mode)) {
+                if (subdir_list_append(&subdirs, name, dev, mtime_ns) != 0) {
+                    no_memory = 1;
+                    break;
+                }
+            } else if (S_ISREG(mode)) {
+                total_size += size;
+                file_count++;
+            }
+        }
+        closedir(dir);
+    }
+    Py_END_ALLOW_THREADS
+
+    PyObject *result = NULL;
+
+    if (no_memory) {
+        PyErr_NoMemory();
+    } else if (error != 0) {
+        errno = error;
+        PyErr_SetFromErrnoWithFilenameObject(PyExc_OSError, path_obj);
+    } else {
+        PyObject *list = PyList_New((Py_ssize_t)subdirs.count);
+        if (list != NULL) {
+            for (size_t i = 0; i < subdirs.count; i++) {
+                PyObject *item;
+                if (with_stamps)
+                    item = Py_BuildValue("(O&(KL))", PyUnicode_DecodeFSDefault, subdirs.names + subdirs.offsets[i],
+                                         subdirs.devs[i], subdirs.mtimes[i]);
+                else
+                    item = Py_BuildValue("(O&O)", PyUnicode_DecodeFSDefault, subdirs.names + subdirs.offsets[i], Py_None);
+                if (item == NULL) {
+                    Py_CLEAR(list);
+                    break;
+                }
+                PyList_SET_ITEM(list, (Py_ssize_t)i, item);
+            }
+        }
+        if (list != NULL)
+            result = Py_BuildValue("(KKN)", total_size, file_count, list);
+    }
+
+    subdir_list_free(&subdirs);
+    Py_DECREF(path_bytes);
+    return result;
+}
+
+static PyMethodDef cbackupscan_methods[] = {
+    {"scan_dir", scan_dir, METH_VARARGS,
+     "scan_dir(path, with_stamps, use_statx=False) -> (total_size, file_count, [(subdir_name, (st_dev, mtime_ns) or None), ...])\n\n"
+     "Sum the sizes of the regular files directly inside path and list its subdirectories.\n"
+     "Symlinks are not followed."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef cbackupscan_module = {
+    PyModuleDef_HEAD_INIT,
+    "cbackupscan",
+    "Directory scanning helpers for the backup tools.",
+    -1,
+    cbackupscan_methods
+};
+
+PyMODINIT_FUNC PyInit_cbackupscan(void)
+{
+    return PyModule_Create(&cbackupscan_module);
+}
@@ -0,0 +1,212 @@
+import ctypes
+import ctypes.util
+import errno
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+AT_FDCWD = -100
+AT_SYMLINK_NOFOLLOW = 0x100
+AT_STATX_DONT_SYNC = 0x4000
+STATX_SIZE = 0x200
+
+# Filesystem types (from /proc/self/mounts) where AT_STATX_DONT_SYNC avoids a round trip to the server
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ceph", "fuse.sshfs", "9p"}
+
+# Maximum number of directories handed to a worker per future
+SCAN_BATCH_SIZE = 50
+# Minimum number of seconds between two status updates
+STATUS_UPDATE_INTERVAL = 0.1
+STATUS_TEMPLATE = "Scanning %s (%d files, %d MB)"
+
+class _Statx(ctypes.Structure):
+    # Only the leading fields of struct statx are named, the rest is padding up to its 256 bytes
+    _fields_ = [
+        ("stx_mask", ctypes.c_uint32),
+        ("stx_blksize", ctypes.c_uint32),
+        ("stx_attributes", ctypes.c_uint64),
+        ("stx_nlink", ctypes.c_uint32),
+        ("stx_uid", ctypes.c_uint32),
+        ("stx_gid", ctypes.c_uint32),
+        ("stx_mode", ctypes.c_uint16),
+        ("__spare0", ctypes.c_uint16),
+        ("stx_ino", ctypes.c_uint64),
+        ("stx_size", ctypes.c_uint64),
+        ("__spare1", ctypes.c_uint8 * 208),
+    ]
+
+def _load_statx():
+    if sys.platform != "linux":
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        statx = libc.statx
+    except (OSError, AttributeError):
+        # No libc statx wrapper (glibc < 2.28, musl < 1.2.5)
+        return None
+
+    statx.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint, ctypes.POINTER(_Statx)]
+    statx.restype = ctypes.c_int
+    return statx
+
+_statx = _load_statx()
+_buffers = threading.local()
+
+def _unescape_mount_path(path):
+    # /proc/self/mounts escapes spaces, tabs, newlines and backslashes as octal
+    return re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), path)
+
+def is_network_path(path):
+    try:
+        with open("/proc/self/mounts") as mounts:
+            entries = [line.split() for line in mounts]
+    except OSError:
+        return False
+
+    path = os.path.realpath(path)
+    best_mount = ""
+    best_type = None
+    for fields in entries:
+        mount_point = _unescape_mount_path(fields[1])
+        if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+            # The longest match wins; on ties the later, overmounting entry does
+            if len(mount_point) >= len(best_mount):
+                best_mount, best_type = mount_point, fields[2]
+
+    return best_type in NETWORK_FILESYSTEMS
+
+def entry_size(entry, use_statx=False):
+    # statx through ctypes is slower than DirEntry.stat on local disks, it only pays off on network mounts
+    global _statx
+
+    if use_statx and _statx is not None:
+        buf = getattr(_buffers, "statx", None)
+        if buf is None:
+            buf = _buffers.statx = _Statx()
+
+        flags = AT_SYMLINK_NOFOLLOW | AT_STATX_DONT_SYNC
+        if _statx(AT_FDCWD, os.fsencode(entry.path), flags, STATX_SIZE, ctypes.byref(buf)) == 0:
+            return buf.stx_size
+        if ctypes.get_errno() == errno.ENOSYS:
+            # Kernel older than 4.11, stop trying
+            _statx = None
+
+    return entry.stat(follow_symlinks=False).st_size
+
+def dir_stamp(stat_result):
+    # What the scan cache validates a directory by: its device and its own mtime
+    return stat_result.st_dev, stat_result.st_mtime_ns
+
+def _scan_dir(path, with_stamps, use_statx=False):
+    total_size = 0
+    file_count = 0
+    subdirs = []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stamp = dir_stamp(entry.stat(follow_symlinks=False)) if with_stamps else None
+                subdirs.append((entry.name, stamp))
+            elif entry.is_file(follow_symlinks=False):
+                size = entry_size(entry, use_statx)
+                total_size += size
+                file_count += 1
+
+    return total_size, file_count, subdirs
+
+try:
+    # Built with `python setup.py build_ext --inplace`, see cbackupscan.c
+    from cbackupscan import scan_dir
+except ImportError:
+    scan_dir = _scan_dir
+
+class ScanAborted(Exception):
+    pass
+
+class ScanCancelled(Exception):
+    pass
+
+def scan_directories(dirs, cache=None, use_statx=False):
+    total_size = 0
+    file_count = 0
+    subdirs = []
+
+    for path, stamp in dirs:
+        cached = cache.get(path, stamp) if cache is not None else None
+        if cached is not None:
+            # Unchanged directory: reuse its file totals and only stat the subdirectories
+            dir_size, dir_count, names = cached
+            for name in names:
+                subdir = os.path.join(path, name)
+                subdirs.append((subdir, dir_stamp(os.stat(subdir, follow_symlinks=False))))
+        else:
+            dir_size, dir_count, entries = scan_dir(path, cache is not None, use_statx)
+            names = [name for name, _ in entries]
+            subdirs.extend((os.path.join(path, name), subdir_stamp) for name, subdir_stamp in entries)
+
+            if cache is not None:
+                cache.put(path, stamp, dir_size, dir_count, names)
+
+        total_size += dir_size
+        file_count += dir_count
+
+    return total_size, file_count, subdirs
+
+def get_folder_info(folder_path, max_workers=8, report_status=None, abort_if_exceeds=None, cache=None, executor=None, stop_event=None):
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                return get_folder_info(folder_path, max_workers, report_status, abort_if_exceeds, cache, executor, stop_event)
+            finally:
+                # Drop queued batches when the scan raises, e.g. a Streamlit stop inside report_status
+                executor.shutdown(cancel_futures=True)
+
+    total_size = 0
+    file_count = 0
+    last_update = time.monotonic()
+
+    stack = deque([(folder_path, dir_stamp(os.stat(folder_path)) if cache is not None else None)])
+    pending = set()
+    use_statx = is_network_path(folder_path)
+
+    while stack or pending:
+        # Keep at most two batches per worker in flight; the rest waits on the stack
+        while stack and len(pending) < 2 * max_workers:
+            # Spread small stacks over all workers instead of handing them to a single one
+            batch_size = max(1, min(SCAN_BATCH_SIZE, math.ceil(len(stack) / max_workers)))
+            batch = [stack.pop() for _ in range(batch_size)]
+            pending.add(executor.submit(scan_directories, batch, cache, use_statx))
+
+        # Wake up regularly to notice stop_event even while a long batch is running
+        done, pending = wait(pending, timeout=STATUS_UPDATE_INTERVAL, return_when=FIRST_COMPLETED)
+        if stop_event is not None and stop_event.is_set():
+            for future in pending:
+                future.cancel()
+            raise ScanCancelled(folder_path)
+
+        for future in done:
+            size, count, subdirs = future.result()
+            total_size += size
+            file_count += count
+            stack.extend(subdirs)
+
+        # abort_if_exceeds returns the current byte bound, or None while there is none yet
+        limit = abort_if_exceeds() if abort_if_exceeds is not None else None
+        if limit is not None and total_size > limit:
+            # Only this scan's batches; the executor may be shared with other scans
+            for future in pending:
+                future.cancel()
+            raise ScanAborted(folder_path)
+
+        now = time.monotonic()
+        if report_status is not None and now - last_update > STATUS_UPDATE_INTERVAL:
+            report_status(STATUS_TEMPLATE % (folder_path, file_count, total_size >> 20))
+            last_update = now
+
+    return total_size, file_count
@@ -1,36 +1,22 @@
-import os
+from operator import itemgetter
 import streamlit as st
-
-def get_folder_info(folder_path, status_text=None):
-    total_size = 0
-    file_count = 0
-
-    for entry in os.scandir(folder_path):
-        if entry.is_file():
-            total_size += entry.stat().st_size
-            file_count += 1
-        elif entry.is_dir():
-            subdir_size, subdir_file_count = get_folder_info(entry.path, status_text)
-            total_size += subdir_size
-            file_count += subdir_file_count
-
-        if status_text:
-            status_text.text(f"Scanning {entry.name}, in {folder_path}")
-
-    return total_size, file_count
+from fast_stat import get_folder_info
 
 def efficient_fitting_greedy(folder_infos, hard_disk_size_tb, safety_margin_percent):
     hard_disk_size_bytes = hard_disk_size_tb * (1024 ** 4)
     safety_margin = hard_disk_size_bytes * (safety_margin_percent / 100)
     adjusted_hard_disk_size_bytes = hard_disk_size_bytes - safety_margin
 
-    folder_sizes = [(folder, size) for folder, size, _ in folder_infos]
-    folder_sizes.sort(key=lambda x: x[1], reverse=True)
+    folder_sizes = sorted(folder_infos, key=itemgetter(1), reverse=True)
 
     result_folders = []
     remaining_space = adjusted_hard_disk_size_bytes
+    smallest_size = folder_sizes[-1][1] if folder_sizes else 0
 
-    for folder, size in folder_sizes:
+    for folder, size, _ in folder_sizes:
+        # Nothing left can fit once the smallest folder no longer does
+        if remaining_space < smallest_size:
+            break
         if size <= remaining_space:
             result_folders.append((folder, size))
             remaining_space -= size
@@ -41,33 +27,45 @@ st.title("Folder Analyzer")
 
 hard_disk_size_tb = st.sidebar.number_input("Hard Disk Size (TB)", min_value=0.0, value=1.0, step=0.01)
 safety_margin_percent = st.sidebar.slider("Safety Margin (%)", min_value=0, max_value=100, value=10)
+scan_threads = st.sidebar.number_input("Scan threads", min_value=1, value=8, step=1)
 
 st.header("Folders")
 
-if 'folder_count' not in st.session_state:
-    st.session_state.folder_count = 1
+state = st.session_state
+
+if 'folder_count' not in state:
+    state.folder_count = 1
+
+folder_count = state.folder_count
+folders = [None] * folder_count
+
+# Inputs only rerun the page when the form is submitted, not on every edit.
+# Every action is a submit button, so typed folders are applied before it runs.
+with st.form("folders_form"):
+    for i in range(folder_count):
+        folder = st.text_input(f"Folder {i + 1}", key=f"folder_{i}")
+        if folder:
+            folders[i] = folder
 
-st.session_state.folders = []
+    add_folder = st.form_submit_button("Add another folder")
+    scan = st.form_submit_button("Scan Storage")
 
-for i in range(st.session_state.folder_count):
-    folder = st.text_input(f"Folder {i + 1}", key=f"folder_{i}")
-    if folder:
-        st.session_state.folders.append(folder)
+state.folders = [folder for folder in folders if folder is not None]
 
-if st.button("Add another folder"):
-    st.session_state.folder_count += 1
+if add_folder:
+    state.folder_count += 1
 
-if st.button("Scan Storage"):
-    if not st.session_state.get('folders', []):
+if scan:
+    if not state.get('folders', []):
         st.error("Please add at least one folder.")
     else:
         status_text = st.empty()
         progress_bar = st.progress(0)
 
         folder_infos = []
-        for i, folder in enumerate(st.session_state.folders):
-            progress_bar.progress((i + 1) / len(st.session_state.folders))
-            size, file_count = get_folder_info(folder, status_text)
+        for i, folder in enumerate(state.folders):
+            progress_bar.progress((i + 1) / len(state.folders))
+            size, file_count = get_folder_info(folder, scan_threads, status_text.text)
             folder_infos.append((folder, size, file_count))
 
         status_text.empty()
@@ -77,14 +75,14 @@ if st.button("Scan Storage"):
         for folder, size, file_count in folder_infos:
             st.write(f"{folder} - {size / (1024 ** 2):.2f} MB - {file_count} files")
 
-        st.session_state.folder_infos = folder_infos
+        state.folder_infos = folder_infos
 
 if st.button("Fit in Hard Disk"):
-    if not st.session_state.get('folder_infos', []):
+    if not state.get('folder_infos', []):
         st.error("Please scan the storage first.")
     else:
         result_folders, remaining_space = efficient_fitting_greedy(
-            st.session_state.folder_infos, hard_disk_size_tb, safety_margin_percent
+            state.folder_infos, hard_disk_size_tb, safety_margin_percent
         )
         
         st.write("Folders to fit in hard disk:")
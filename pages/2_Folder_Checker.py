@@ -1,94 +1,184 @@
 import os
+import threading
+from contextlib import closing, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import streamlit as st
+from fast_stat import STATUS_UPDATE_INTERVAL, ScanAborted, get_folder_info
+from scan_cache import ScanCache
+
+def compare_pair(i, dir_a, dir_b, size_threshold, file_count_threshold, report_status=None, max_workers=8, cache=None, scan_executor=None, stop_event=None):
+    sizes = [None, None]
+
+    def scan(side, path):
+        # Stop scanning a side as soon as it can no longer be within the size threshold of the other
+        def bound():
+            other_size = sizes[1 - side]
+            return None if other_size is None else other_size + size_threshold
+
+        try:
+            info = get_folder_info(path, max_workers, report_status, bound, cache, scan_executor, stop_event)
+        except ScanAborted:
+            return None
+        sizes[side] = info[0]
+        return info
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        future_a = executor.submit(scan, 0, dir_a)
+        future_b = executor.submit(scan, 1, dir_b)
+        info_a, info_b = future_a.result(), future_b.result()
+
+    if info_a is None or info_b is None:
+        larger, smaller = (dir_a, dir_b) if info_a is None else (dir_b, dir_a)
+        return f'Directory pair {dir_a} and {dir_b} (pair {i}) are different. {larger} is more than {size_threshold} bytes larger than {smaller}, scanning was stopped early.\n', False
+
+    size_a, num_files_a = info_a
+    size_b, num_files_b = info_b
+    size_delta = abs(size_a - size_b)
+    file_count_delta = abs(num_files_a - num_files_b)
+
+    identical = size_delta <= size_threshold and file_count_delta <= file_count_threshold
+    if identical:
+        result = f'Directory pair {dir_a} and {dir_b} (pair {i}) are identical. The directory size is {size_a} bytes, and it contains {num_files_a} files.\n'
+    else:
+        result = f'Directory pair {dir_a} and {dir_b} (pair {i}) are different. The size delta between directories is {size_delta} bytes, and the file number delta is {file_count_delta} files.\n'
+
+    return result, identical
+
+def start_comparison(numbered_pairs, size_threshold, file_count_threshold, status_text=None, max_workers=8, cache=None):
+    # Compares pairs concurrently and yields (pair number, result, identical) in completion order.
+    # All pairs share one pool of max_workers scan threads; the pair threads only wait on it.
+    pair_workers = max(1, min(len(numbered_pairs), max_workers))
+    stop_event = threading.Event()
+    status_lock = threading.Lock()
+    latest_status = [None]
+
+    def report_status(status):
+        # Called from the pair threads; only the script thread touches status_text
+        with status_lock:
+            latest_status[0] = status
+
+    with ThreadPoolExecutor(max_workers=max_workers) as scan_executor:
+        with ThreadPoolExecutor(max_workers=pair_workers) as executor:
+            try:
+                futures = {
+                    executor.submit(compare_pair, i, dir_a, dir_b, size_threshold, file_count_threshold, report_status, max_workers, cache, scan_executor, stop_event): i
+                    for i, (dir_a, dir_b) in numbered_pairs
+                }
+                pending = set(futures)
+                while pending:
+                    # Streamlit only handles Stop and reruns on the script thread, inside its st calls,
+                    # so keep waking up to update the status from here instead of blocking until a pair is done
+                    done, pending = wait(pending, timeout=STATUS_UPDATE_INTERVAL, return_when=FIRST_COMPLETED)
+                    if status_text is not None:
+                        with status_lock:
+                            status = latest_status[0]
+                        if status is not None:
+                            status_text.text(status)
+
+                    for future in done:
+                        result, identical = future.result()
+                        yield futures[future], result, identical
+            finally:
+                # Also runs when the caller closes the generator early or a pair failed:
+                # no scan may outlive it, since the caller closes the cache afterwards
+                stop_event.set()
+                executor.shutdown(cancel_futures=True)
+                scan_executor.shutdown(cancel_futures=True)
+
+def path_exists(path):
+    # Probe each path once until the next comparison; sidebar changes and form submits rerun the page
+    cache = st.session_state.path_exists_cache
+    if path not in cache:
+        cache[path] = os.path.isdir(path)
+    return cache[path]
 
-def get_folder_info(folder_path, status_text=None, total_size_scanned=0):
-    total_size = 0
-    file_count = 0
 
-    for entry in os.scandir(folder_path):
-        if entry.is_file():
-            entry_size = entry.stat().st_size
-            total_size += entry_size
-            total_size_scanned += entry_size
-            file_count += 1
-            if status_text is not None:
-                status_text.text(f"Scanning {folder_path}")
-        elif entry.is_dir():
-            subdir_size, subdir_file_count, total_size_scanned = get_folder_info(entry.path, status_text, total_size_scanned)
-            total_size += subdir_size
-            file_count += subdir_file_count
 
-    return total_size, file_count, total_size_scanned
 
-def start_comparison(directory_pairs, size_threshold, file_count_threshold, status_text=None):
-    results = []
 
-    for dir_a, dir_b in directory_pairs:
-        size_a, num_files_a, _ = get_folder_info(dir_a, status_text)
-        size_b, num_files_b, _ = get_folder_info(dir_b, status_text)
+size_threshold = st.sidebar.number_input("Size threshold", min_value=0, value=2000, step=1)
+file_count_threshold = st.sidebar.number_input("File count threshold", min_value=0, value=0, step=1)
+scan_threads = st.sidebar.number_input("Scan threads", min_value=1, value=8, step=1)
 
-        size_delta = abs(size_a - size_b)
-        file_count_delta = abs(num_files_a - num_files_b)
+use_cache = st.sidebar.checkbox(
+    "Use scan cache",
+    value=False,
+    help="Reuse saved results for directories whose device and modification time are unchanged. Rewriting an existing file in place does not change its directory's modification time, so leave this off to verify a finished copy.",
+)
 
-        if size_delta <= size_threshold and file_count_delta <= file_count_threshold:
-            result = f'Directory pair {dir_a} and {dir_b} (pair {directory_pairs.index((dir_a, dir_b)) + 1}) are identical. The directory size is {size_a} bytes, and it contains {num_files_a} files.\n'
-        else:
-            result = f'Directory pair {dir_a} and {dir_b} (pair {directory_pairs.index((dir_a, dir_b)) + 1}) are different. The size delta between directories is {size_delta} bytes, and the file number delta is {file_count_delta} files.\n'
+if st.sidebar.button("Clear cache", help="Forget saved scan results."):
+    with ScanCache() as cache:
+        cache.clear()
 
-        identical = size_delta <= size_threshold and file_count_delta <= file_count_threshold
-        results.append((result, identical))
+st.header("Directory Pairs")
 
-    return results
+state = st.session_state
 
+if 'pair_count' not in state:
+    state.pair_count = 1
 
+if 'path_exists_cache' not in state:
+    state.path_exists_cache = {}
 
+pair_count = state.pair_count
+pairs = [None] * pair_count
 
+# Inputs only rerun the page when the form is submitted, not on every edit.
+# Every action is a submit button, so typed paths are applied before it runs.
+with st.form("pairs_form"):
+    for i in range(pair_count):
+        col1, col2 = st.columns(2)
+        with col1:
+            dir_a = st.text_input(f"Directory A (pair {i + 1})", key=f"dir_a_{i}")
+        with col2:
+            dir_b = st.text_input(f"Directory B (pair {i + 1})", key=f"dir_b_{i}")
 
-size_threshold = st.sidebar.number_input("Size threshold", min_value=0, value=2000, step=1)
-file_count_threshold = st.sidebar.number_input("File count threshold", min_value=0, value=0, step=1)
+        if dir_a and dir_b:
+            pairs[i] = (dir_a, dir_b)
 
-st.header("Directory Pairs")
+        for path in (dir_a, dir_b):
+            if path and not path_exists(path):
+                st.error(f"{path} is not an existing directory.")
 
-if 'pair_count' not in st.session_state:
-    st.session_state.pair_count = 1
+    st.form_submit_button("Apply pairs")
+    add_pair = st.form_submit_button("Add another pair")
+    start = st.form_submit_button("Start comparison")
 
-st.session_state.directory_pairs = []
+state.directory_pairs = [pair for pair in pairs if pair is not None]
 
-for i in range(st.session_state.pair_count):
-    col1, col2 = st.columns(2)
-    with col1:
-        dir_a = st.text_input(f"Directory A (pair {i + 1})", key=f"dir_a_{i}")
-    with col2:
-        dir_b = st.text_input(f"Directory B (pair {i + 1})", key=f"dir_b_{i}")
+if add_pair:
+    state.pair_count += 1
 
-    if dir_a and dir_b:
-        st.session_state.directory_pairs.append((dir_a, dir_b))
-
-if st.button("Add another pair"):
-    st.session_state.pair_count += 1
-
-if st.button("Start comparison"):
-    if not st.session_state.get('directory_pairs', []):
+if start:
+    if not state.get('directory_pairs', []):
         st.error("Please add at least one pair of directories.")
     else:
         # Create a progress bar and a status text output
         progress_bar = st.progress(0)
         status_text = st.empty()
 
-        results = []
-        num_pairs = len(st.session_state.directory_pairs)
-
-        for index, pair in enumerate(st.session_state.directory_pairs, start=1):
-            # Update progress bar
-            progress_bar.progress(index / num_pairs)
-
-            result, identical = start_comparison([pair], size_threshold, file_count_threshold, status_text)[0]
-            results.append((result, identical))
-
-            # Clear status text
-            status_text.empty()
-
-        for result, identical in results:
-            background_color = "rgba(144, 238, 144, 0.5)" if identical else "rgba(255, 182, 193, 0.5)"
-            st.markdown(f"<div style='background-color: {background_color}; padding: 10px;'>{result}</div>", unsafe_allow_html=True)
-            st.write("---")
\ No newline at end of file
+        # Probe the paths again in case a disk was plugged in or removed since they were entered
+        state.path_exists_cache = {}
+
+        numbered_pairs = []
+        for index, pair in enumerate(state.directory_pairs, start=1):
+            missing = [path for path in pair if not path_exists(path)]
+            if missing:
+                st.error(f"Pair {index} skipped, not an existing directory: {', '.join(missing)}")
+                st.write("---")
+            else:
+                numbered_pairs.append((index, pair))
+
+        with ScanCache() if use_cache else nullcontext() as cache:
+            # A Stop or rerun raises out of the loop; closing the comparisons stops their scans before the cache closes
+            with closing(start_comparison(numbered_pairs, size_threshold, file_count_threshold, status_text, scan_threads, cache)) as comparisons:
+                for done, (_, result, identical) in enumerate(comparisons, start=1):
+                    # Update progress bar
+                    progress_bar.progress(done / len(numbered_pairs))
+
+                    background_color = "rgba(144, 238, 144, 0.5)" if identical else "rgba(255, 182, 193, 0.5)"
+                    st.markdown(f"<div style='background-color: {background_color}; padding: 10px;'>{result}</div>", unsafe_allow_html=True)
+                    st.write("---")
+
+        # Clear status text
+        status_text.empty()
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.adm_backup_scan_cache")
+# Commit regularly so other sessions are not locked out of the cache during long scans
+COMMIT_EVERY = 1000
+# Bump when the table layout changes; older caches are dropped, not migrated
+SCHEMA_VERSION = 5
+
+class ScanCache:
+    # Per-directory scan results keyed by path and validated by the directory's device and own mtime.
+    # Each entry only covers the files directly inside the directory, plus its subdirectory names.
+    # Rewriting a file in place does not change the directory mtime, so hits can be stale.
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.uncommitted = 0
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS scan_cache")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scan_cache ("
+            "path BLOB PRIMARY KEY, dev INTEGER, mtime_ns INTEGER, size INTEGER, file_count INTEGER, subdirs BLOB)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, path, stamp):
+        dev, mtime_ns = stamp
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, file_count, subdirs FROM scan_cache WHERE path = ? AND dev = ? AND mtime_ns = ?",
+                (os.fsencode(path), dev, mtime_ns),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        size, file_count, subdirs = row
+        # Names cannot contain a slash, so it doubles as the separator
+        return size, file_count, [os.fsdecode(name) for name in subdirs.split(b"/") if name]
+
+    def put(self, path, stamp, size, file_count, subdirs):
+        dev, mtime_ns = stamp
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO scan_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (os.fsencode(path), dev, mtime_ns, size, file_count, b"/".join(os.fsencode(name) for name in subdirs)),
+            )
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_EVERY:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM scan_cache")
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
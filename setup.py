@@ -0,0 +1,14 @@
+# Optional C scanner, build it next to the pages with: python setup.py build_ext --inplace
+# It needs POSIX dirent/fstatat, so it is not built on Windows; fast_stat falls back to os.scandir there.
+import os
+
+from setuptools import Extension, setup
+
+ext_modules = []
+if os.name == "posix":
+    ext_modules.append(Extension("cbackupscan", ["cbackupscan.c"], extra_compile_args=["-O3"]))
+
+setup(
+    name="cbackupscan",
+    ext_modules=ext_modules,
+)